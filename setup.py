@@ -25,7 +25,7 @@ setuptools.setup(
    description="Toolbox for generating in-silico microscopy images from molecular simulations",
    url="https://github.com/subhamoymahajan/in-silico-microscopy",
    license='GPLv3',
-   install_requires=['numpy','matplotlib','opencv-python','tifffile'],
+   install_requires=['numpy','matplotlib','opencv-python','tifffile>=2022.7.28','pillow'],
    packages=['siliscopy'],
    package_data={'': ['LICENSE.txt'],'siliscopy': ['gen_mono', 'gen_mono.c']},
    classifiers=[
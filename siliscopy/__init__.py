@@ -15,6 +15,15 @@
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.)
 
+import os
+import multiprocessing as mp
+#CPUs this process may run on, e.g. those allotted by SLURM or a cgroup. Used
+#to size the process pools of all modules.
+if hasattr(os,'sched_getaffinity'):
+    _NCPU=len(os.sched_getaffinity(0))
+else:
+    _NCPU=mp.cpu_count()
+
 from siliscopy.gen_psf import *
 from siliscopy.gen_mono import *
 from siliscopy.plot_image import *
@@ -262,12 +262,15 @@ def mt_mix(Is,lam_hues,small=1.9E-3):
     XY=[0,0]
     Inonzero=[]
     ncol=0
+    hues=np.deg2rad(np.asarray(lam_hues,dtype=float))
+    cos_h=np.cos(hues)
+    sin_h=np.sin(hues)
     for i in range(len(Is)):
         if newIs[i]>small:
             # V*e^(i(hue)) #I0 was multiplied when determining 
             # grey images.
-            XY[0]+=newIs[i]*np.cos(lam_hues[i]*np.pi/180)
-            XY[1]+=newIs[i]*np.sin(lam_hues[i]*np.pi/180)
+            XY[0]+=newIs[i]*cos_h[i]
+            XY[1]+=newIs[i]*sin_h[i]
             Inonzero.append(newIs[i])
             ncol+=1
     if ncol==0:
@@ -17,6 +17,7 @@
 
 import os
 import multiprocessing as mp
+from . import _NCPU
 from . import convert
 def gen_mono_c(data,silent=False):
     """ Runs the C-binary to calculate monochome intensities
@@ -83,7 +84,7 @@ def gen_mono_c_mp(datafile):
         else: #slice
             Arg_slice.append([Arguments[i],True])
 
-    pool=mp.Pool(mp.cpu_count())
+    pool=mp.Pool(_NCPU)
     results=pool.starmap(gen_mono_c,Arg_slice)
 
     for i in range(len(Arg_vol)):
@@ -22,6 +22,7 @@ import scipy.integrate as integrate
 import scipy.special as special
 import numpy as np
 import multiprocessing as mp
+from . import _NCPU
 import os 
 
 
@@ -147,7 +148,7 @@ def psf_gandy_mp(NA, meu, lambd, dlmn, Plmn, fs, outname):
     for k in range(Nn):
         Arguments.append([NA, meu, lambd, dlmn, Plmn, fs, outname+'n'+str(k), 'w', 
                           k])
-    pool=mp.Pool(mp.cpu_count())
+    pool=mp.Pool(_NCPU)
     results=pool.map(worker_gandy,Arguments)
     os.system('mv ' + outname + 'n0 ' + outname + '_lam' + str(lambd) + \
               '_fs' + str(fs) + '.dat')
@@ -322,7 +323,7 @@ def psf_GL1991_mp(NA, meu, meu0, t0, tsO, meus, tg, tg0, meug, meug0, lambd,\
     for k in range(-Nn,Nn+1):
         Arguments.append([NA, meu, meu0, t0, tsO, meus, tg, tg0, meug, meug0,
             lambd, dlmn, Plmn, fs, outname+'n'+str(k), 'w', k])
-    pool=mp.Pool(mp.cpu_count())
+    pool=mp.Pool(_NCPU)
     results=pool.starmap(psf_GL1991_sep,Arguments)
     os.system('mv ' + outname+'n'+str(-Nn)+' ' + outname+'_tsO' + "%g"%tsO + \
               '_lam'+str(lambd)+ '_fs'+str(fs)+'.dat')
@@ -501,7 +502,7 @@ def psf_Mod_Gandy_mp(NA, meu, meu0, t0, tsO, meus, tg, tg0, meug, meug0, \
     for k in range(-Nn,Nn+1):
         Arguments.append([NA, meu, meu0, t0, tsO, meus, tg, tg0, meug, meug0, 
             lambd, dlmn, Plmn, fs, outname+'n'+str(k), 'w', k])
-    pool=mp.Pool(mp.cpu_count())
+    pool=mp.Pool(_NCPU)
     results=pool.starmap(psf_Mod_Gandy_sep,Arguments)
     os.system('mv ' + outname+'n'+str(-Nn)+' ' + outname+'_tsO'+ "%g"%tsO + \
               '_lam'+str(lambd)+ '_fs'+str(fs)+'.dat')
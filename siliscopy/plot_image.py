@@ -20,14 +20,110 @@ import numpy as np
 import matplotlib.pyplot as plt
 import multiprocessing as mp
 import sys
-import copy
+import itertools
+import collections
 import tifffile as tif
 import os
+from PIL import Image
+from . import _NCPU
 small=1E-10
+#Cache each image data file read as a binary .npy file. See ''read_dat''.
+cache_dat=True
+#Lossless Deflate with horizontal differencing for 2DT, 3D, and 3DT tiff files.
+tiff_compression={'compression': 'zlib', 'compressionargs': {'level': 5},
+    'predictor': True}
+#Uncompressed size (bytes) above which tiled BigTIFF files are written instead
+#of ImageJ hyperstacks, which are limited to 4 GB.
+bigtiff_size=2**31
+tiff_tile=(256,256)
+#Start method of pool workers. Forked workers do not re-import numpy, 
+#matplotlib, and tifffile. fork is unavailable on Windows and unsafe on macOS,
+#which keep their default (spawn).
+mp_ctx=mp.get_context('fork' if sys.platform.startswith('linux') else None)
+
+def read_dat(fname, cache=None):
+    """ Reads image intensities from an image data file.
+
+    The first read parses the ASCII file, with pandas if it is installed, and
+    caches it as a binary .npy file with the same name. Later reads load the
+    .npy file, as long as it is not older than the ASCII file. The ASCII file
+    is still read directly by ''prop.get_maxI'' and ''prop.get_hist'', so it
+    should be kept. No .npy file is written if cache_dat is False or the 
+    directory is not writable.
+
+    Parameters
+    ----------
+    fname: str
+        Filename of the image data file (.dat).
+    cache: bool, optional
+        Whether the .npy file is used. If None, cache_dat is used. Passed 
+        explicitly to processes that may not share this module's settings.
+
+    Returns
+    -------
+    I: 2D ndarray
+        Image intensities without I0 scaling. Axes are XY or LM.
+    """
+    if cache is None:
+        cache=cache_dat
+    npy=fname[:-4]+'.npy'
+    if cache and os.path.exists(npy) and (not os.path.exists(fname) or
+        os.path.getmtime(npy)>=os.path.getmtime(fname)):
+        return np.load(npy)
+    I=_read_ascii(fname)
+    if not cache:
+        return I
+    tmp=npy[:-4]+'_'+str(os.getpid())+'.tmp.npy'
+    try: #Write and rename, other processes may read the same file.
+        np.save(tmp,I)
+        os.replace(tmp,npy)
+    except OSError: #e.g. read-only directory; keep using the ASCII file.
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return I
+
+def _read_ascii(fname):
+    """ Parses an ASCII image data file, with pandas if it is installed. 
+        pandas is imported here, since it is only needed for files that are
+        not cached yet.
+    """
+    try: #Optional, faster parser for image data files
+        import pandas as pd
+    except ImportError:
+        return np.loadtxt(fname, comments='#', ndmin=2, dtype=np.float32)
+    return pd.read_csv(fname, sep=r'\s+', comment='#', header=None,
+                       dtype=np.float32).to_numpy()
+
+def _init_worker(cache, backend=None):
+    """ Initializes a pool worker with the settings of the parent process. 
+        Spawned workers re-import this module, which resets them.
+    """
+    global cache_dat
+    cache_dat=cache
+    if backend is not None:
+        plt.switch_backend(backend)
+
+def worker_pool(processes, backend=None):
+    """ Creates a process pool whose workers use the current cache_dat.
+
+    Parameters
+    ----------
+    processes: int
+        Number of worker processes.
+    backend: str, optional
+        matplotlib backend of the workers, e.g. 'Agg' for workers that save
+        figures. (default is None, which keeps the default backend)
+
+    Returns
+    -------
+    pool: multiprocessing.Pool
+    """
+    return mp_ctx.Pool(processes, initializer=_init_worker, 
+        initargs=(cache_dat, backend))
 
 def get_grey_img(filename, I0, lam, T, ti, fs, MaxBox, frame=False, \
     opt_axis=None, nidx=None, frame_col=1.0, noise=False, poi=None, 
-    gauss=None, psf_type=0, tsO=None):
+    gauss=None, psf_type=0, tsO=None, pool=None):
     """ Calculates greyscale image
      
     Parameters
@@ -71,19 +167,25 @@ def get_grey_img(filename, I0, lam, T, ti, fs, MaxBox, frame=False, \
     tsO: float
         Distance between the bottom of the coverslip and the object focal 
         plane in nm. Only relevant for depth-variant PSF. (default None)
+    pool: multiprocessing.Pool, optional
+        Pool used to read the T image data files in parallel, e.g. when many
+        ASCII files are parsed for the first time. If None, the files are read
+        serially. (default None)
 
     Returns
     -------
     IMG: 2D ndarray
-        Image intensities between 0 and 1. Image intensity of -1 implies white 
+        Image intensities between 0 and 1. Image intensity of -1 implies white
         frame (absence of molecular simulation system). Axes are XY or LM.
+
+    Writes
+    ------
+    [fname].npy: Binary copy of each image data file read. See ''read_dat''.
     """
     if ti<0 and T>1:
         raise Exception('More than one timesteps cannot be used for a' + \
             ' simulation without time.')
     
-    IMG=np.zeros((MaxBox[0],MaxBox[1]))
-    Cnt=np.zeros((MaxBox[0],MaxBox[1]),dtype=int)
     nstr=''
     if nidx != None:
         xyz='xyz'
@@ -91,39 +193,27 @@ def get_grey_img(filename, I0, lam, T, ti, fs, MaxBox, frame=False, \
     tstr=''
     if psf_type==1:
         tstr='_tsO'+"%g"%tsO
+    fnames=[]
     for i in range(T):
         if ti>=0:
             fname=filename + str(i+ti) + nstr + tstr + '_lam' + str(lam) + '_fs' + \
                   str(fs) + '.dat'
         else:
             fname=filename + nstr + tstr + '_lam' + str(lam) + '_fs' + str(fs) + '.dat'
-        print('Reading: '+fname+'      ',end='\r') 
-        f=open(fname,'r')
-        j=0
-        for lines in f:
-            foo=lines.split()
-            if foo[0][0]=='#':
-                continue
-            for k in range(len(IMG[0])):
-                I=float(foo[k])*I0
-                if I>1:
-                    IMG[j,k]+=1.0
-                    Cnt[j,k]+=1
-                elif I>= -small:
-                    IMG[j,k]+=I
-                    Cnt[j,k]+=1
-                # else its white frame - do nothing
-            j+=1                            
-        f.close()
-    for j in range(len(IMG)):
-        for k in range(len(IMG[0])):
-            if Cnt[j,k]>0:
-                IMG[j,k]=IMG[j,k]/float(Cnt[j,k])
-            else:
-                if frame:
-                    IMG[j,k]=-1
-                else:
-                    IMG[j,k]=frame_col
+        print('Reading: '+fname+'      ',end='\r')
+        fnames.append(fname)
+    if T>1 and pool is not None:
+        Is=pool.starmap(read_dat,[(fname,cache_dat) for fname in fnames])
+    else:
+        Is=[read_dat(fname) for fname in fnames]
+    I=np.stack(Is)*I0
+    valid=I>=-small # else its white frame - do nothing
+    IMG=np.where(valid, np.minimum(I,1.0), 0.0).sum(axis=0)
+    Cnt=valid.sum(axis=0)
+    if frame:
+        frame_col=-1.0
+    IMG=np.divide(IMG, Cnt, out=np.full(IMG.shape, frame_col, dtype=np.float32),
+        where=Cnt>0)
     if noise:
         IMG=add_noise(IMG,poi,gauss) 
     return IMG
@@ -149,9 +239,7 @@ def add_scale(IMG, scale, Bm):
     Llast=int(0.9*len(IMG[0]))
     Hlast=int(0.9*len(IMG))
     wid=int(len(IMG)*0.005)
-    for i in range(Llast-L,Llast+1):
-        for j in range(Hlast-wid,Hlast+wid+1):
-            IMG[j][i]=1.0
+    IMG[Hlast-wid:Hlast+wid+1,Llast-L:Llast+1]=1.0 #all channels if XYC
     return IMG
 
 def plot_ism(IMG, lam_I0, lam, T, ti, fs, img_hei=3.0, filename=None, 
@@ -196,7 +284,8 @@ def plot_ism(IMG, lam_I0, lam, T, ti, fs, img_hei=3.0, filename=None,
     ------
     [filename]: JPEG Image file
         Writes the in-silico microscopy image if show is False and filename 
-        is not None
+        is not None. JPEG and PNG files are written with Pillow, resampled 
+        to the size and (approximately) the interpolation of matplotlib.
     """
     consts=IMG.shape
     if filename!=None:
@@ -222,7 +311,26 @@ def plot_ism(IMG, lam_I0, lam, T, ti, fs, img_hei=3.0, filename=None,
 
     if otype in ["jpeg", "png", "JPEG", "PNG"]:
         img_width=consts[1]*img_hei/consts[0]
-        IMG[IMG<0]=frame_col
+        IMG=np.where(IMG<0, frame_col, IMG) #keeps the input unchanged
+        if filename!=None and show==False: #Write pixels without a figure
+            IMG=np.clip(IMG,0,1)
+            if len(consts)==2 and gcolmap!='gray':
+                IMG=plt.get_cmap(gcolmap)(IMG)[:,:,:3]
+            img=Image.fromarray((IMG*255).astype(np.uint8))
+            #Same size as an image saved by matplotlib
+            size=(max(1,int(round(img_width*dpi))),
+                  max(1,int(round(img_hei*dpi))))
+            #Same resampling as matplotlib's default 'antialiased' imshow:
+            #nearest if zoomed by more than 3 or exactly 1 or 2, otherwise a
+            #Hann(ing) window, for which Pillow's Hamming window is closest.
+            zoom=(size[0]/consts[1],size[1]/consts[0])
+            if all(z>3 or z in (1,2) for z in zoom):
+                img=img.resize(size, Image.NEAREST)
+            else:
+                img=img.resize(size, Image.HAMMING)
+            print('Writing: '+fname)
+            img.save(fname, dpi=(dpi,dpi)) #Default JPEG quality, as matplotlib
+            return
         fig,ax=plt.subplots(1, 1, figsize=(img_width, img_hei))
         if len(consts)==2: #Greyscale
             ax.imshow(IMG, vmin=0, vmax=1, cmap=gcolmap)
@@ -233,12 +341,8 @@ def plot_ism(IMG, lam_I0, lam, T, ti, fs, img_hei=3.0, filename=None,
         ax.set_yticks([])
         plt.axis('off')
         plt.tight_layout(pad=0)
-        if filename==None or show==True:
-            plt.show()
-            return
-        print('Writing: '+fname)
-        plt.savefig(fname,dpi=dpi)
-        plt.close()
+        plt.show()
+        return
     else:
         if otype in ["tiff8", "tif8"]:
             IMG=intensity2image(IMG,np.uint8) #IMG in CYX
@@ -253,7 +357,7 @@ def plot_ism(IMG, lam_I0, lam, T, ti, fs, img_hei=3.0, filename=None,
 
 def get_col_img(filename, lam_I0s, lams, lam_hues, T, ti, fs, MaxBox, 
     mix_type='mt', opt_axis=None, nidx=None, noise=False,  poi=None, 
-    gauss=None, psf_type=0, tsO=None):
+    gauss=None, psf_type=0, tsO=None, pool=None):
     """ Calculates the image intensity for a color image,
 
     Parameters
@@ -287,6 +391,8 @@ def get_col_img(filename, lam_I0s, lams, lam_hues, T, ti, fs, MaxBox,
         see ''get_grey_img''
     tsO:
         see ''get_grey_img''
+    pool:
+        see ''get_grey_img''
 
     Returns
     ------- 
@@ -294,12 +400,11 @@ def get_col_img(filename, lam_I0s, lams, lam_hues, T, ti, fs, MaxBox,
         Axes XYC. Axis 2 corresponds to red, green and blue channels. Image 
         intensities between 0 and 1.
     """
-    IMGs=np.zeros((MaxBox[0],MaxBox[1],len(lams)))
-    for i in range(len(lams)):
-        foo=get_grey_img(filename, lam_I0s[i], lams[i], T, ti, fs, MaxBox, 
-            frame=True, opt_axis=opt_axis, nidx=nidx, noise=noise, poi=poi, 
-            gauss=gauss, psf_type=psf_type, tsO=tsO)
-        IMGs[:,:,i]=foo[:,:]
+    IMGs=np.stack([get_grey_img(filename, lam_I0s[i], lams[i], T, ti, fs,
+        MaxBox, frame=True, opt_axis=opt_axis, nidx=nidx, noise=noise, poi=poi,
+        gauss=gauss, psf_type=psf_type, tsO=tsO, pool=pool) 
+        for i in range(len(lams))],
+        axis=-1)
     if mix_type=='none':
         return IMGs
     col_IMG=add_color(IMGs,lam_hues, -1, mix_type)
@@ -344,6 +449,48 @@ def hsv2rgb(h, s, v):
     else:
         return A1,A3,A2
 
+def hsv2rgb_vec(h, s, v, out=None):
+    """ Convert arrays of hue-saturation-value to red-green-blue
+
+    Array version of ''hsv2rgb''.
+
+    Parameters
+    ----------
+    h: ndarray of floats
+        Hue between 0 (0 degrees) and 1 (360 degrees).
+    s: ndarray of floats
+        Saturation between 0 and 1. Same shape as h.
+    v: ndarray of floats
+        Value between 0 and 1. Same shape as h, or a scalar.
+    out: ndarray, optional
+        Array of shape h.shape+(3,) to store the result in. (default is None)
+
+    Returns
+    -------
+    rgb: ndarray of floats
+        red, green, blue between 0 and 1 along the last axis. Shape is
+        h.shape+(3,).
+    """
+    h=np.asarray(h,dtype=float)
+    s=np.asarray(s,dtype=float)
+    v=np.asarray(v,dtype=float)
+    if np.any(h>1) or np.any(s>1) or np.any(v>1):
+        raise Exception("h, s, or v > 1")
+
+    A1=v #C+m
+    A2=v*(1 - s*abs((h*6)%2-1))  #X+m
+    A3=v*(1 - s) #m
+    #sector of the hue, same comparisons as ''hsv2rgb''
+    sec=np.searchsorted([1/6.,2/6.,3/6.,4/6.,5/6.],h,side='right')
+    rgb=out
+    if rgb is None:
+        rgb=np.empty(h.shape+(3,))
+    perms=[(A1,A2,A3),(A2,A1,A3),(A3,A1,A2),(A3,A2,A1),(A2,A3,A1),
+           (A1,A3,A2)]
+    for k in range(3):
+        rgb[...,k]=np.choose(sec,[p[k] for p in perms])
+    return rgb
+
 def rgb2hsv(r, g, b):
     """ Convert red-green-blue to hue-saturation-value  
 
@@ -384,7 +531,65 @@ def rgb2hsv(r, g, b):
     else:
         s=delta/Cmax
    
-    return h,s, Cmax 
+    return h,s, Cmax
+
+def rgb2hsv_vec(rgb):
+    """ Convert an array of red-green-blue to hue-saturation-value
+
+    Array version of ''rgb2hsv''.
+
+    Parameters
+    ----------
+    rgb: ndarray of floats
+        red, green, blue between 0 and 1 along the last axis.
+
+    Returns
+    -------
+    hsv: ndarray of floats
+        hue, saturation, value between 0 and 1 along the last axis.
+    """
+    rgb=np.asarray(rgb,dtype=float)
+    if np.any(rgb>1):
+        raise Exception("r, g, or b > 1")
+    r,g,b=[rgb[...,0],rgb[...,1],rgb[...,2]]
+    Cmax=rgb.max(axis=-1)
+    Cmin=rgb.min(axis=-1)
+    delta=Cmax-Cmin
+    with np.errstate(divide='ignore',invalid='ignore'):
+        h=np.select([delta<1E-6, Cmax==r, Cmax==g],
+                    [0., ((g-b)/delta)%6, ((b-r)/delta)%6],
+                    ((r-g)/delta)%6)/6.
+        s=np.where(Cmax==0, 0., delta/Cmax)
+    return np.stack((h,s,Cmax),axis=-1)
+
+_HUE_CACHE={}
+def _get_hue_tables(lam_hues):
+    """ Returns cos and sin of the hues, and their RGB colors. The tables are
+        calculated once for each set of hues.
+
+    Parameters
+    ----------
+    lam_hues:
+        see ''get_col_img''
+
+    Returns
+    -------
+    cos_h, sin_h: 1D ndarray
+        Cosine and sine of all hues.
+    cols: 2D ndarray of float32
+        RGB color of all hues at full saturation and value. Axes are hue, RGB.
+        float32, so that 'rgb' mixed images stay float32.
+    """
+    key=tuple(lam_hues)
+    tables=_HUE_CACHE.get(key)
+    if tables is None:
+        hues=np.asarray(lam_hues,dtype=float)
+        tables=(np.cos(hues*2*np.pi/360), np.sin(hues*2*np.pi/360),
+                hsv2rgb_vec(hues/360,1.0,1.0).astype(np.float32))
+        for x in tables: #Shared by all calls
+            x.flags.writeable=False
+        _HUE_CACHE[key]=tables
+    return tables
 
 def add_color(IMGs, lam_hues, frame_col=1.0, mix_type='mt'):
     """ Calculates the image intensity for a color image,
@@ -407,75 +612,68 @@ def add_color(IMGs, lam_hues, frame_col=1.0, mix_type='mt'):
         Image intensities are floats between 0 and 1.
     """
     consts=IMGs.shape
-    col_IMG=np.zeros((consts[0],consts[1],3))
-    if mix_type=='rgb':
-        cols=np.zeros((len(lam_hues),3))
-        for lam_id in range(len(lam_hues)):
-            rgb=hsv2rgb(lam_hues[lam_id]/360,1,1)
-            cols[lam_id,:]=rgb[:]
-
-    for i in range(consts[0]):
-        for j in range(consts[1]):
-            foo=0
-            for lam_id in range(len(lam_hues)):
-                if IMGs[i,j,lam_id]>-small:
-                    foo=+1
-            if foo==0:
-                #if all Img_dat are -1 then res is -1
-                col_IMG[i,j,:]=-1
-            elif mix_type=='mt':
-                xres=0
-                yres=0
-                Is=[]
-                ncol=0
-                for lam_id in range(len(lam_hues)):
-                    if IMGs[i,j,lam_id]>small:
-                        # V*e^(i(hue)) #I0 was multiplied when determining 
-                        # grey images.
-                        xres+=IMGs[i,j,lam_id]*np.cos(lam_hues[lam_id]* \
-                                                       2*np.pi/360)   
-                        yres+=IMGs[i,j,lam_id]*np.sin(lam_hues[lam_id]* \
-                                                       2*np.pi/360)
-                        Is.append(IMGs[i,j,lam_id])
-                        ncol+=1
-
-                if ncol==0: #No fluorescence; black background (by default)
-                    continue
-                Is=sorted(Is) 
-                #arctan2 returns between [-pi,pi]. Dividing it by 2pi yields
-                # [-0.5,0.5]
-                hres=np.arctan2(yres,xres)/(2*np.pi)
-                #this makes hres [0,1]
-                if hres<0:
-                    hres+=1
-                vres=Is[-1] #Largest value
-                if vres>1:
-                    raise Exception("Color's Value is more than 1!")
-                sres=1
-                if ncol>2: #Color should be saturated
-                    sres=1-Is[-3]/Is[-1]
-                if sres<0 or sres>1:
-                    raise Exception("Color's saturation is more than 1")
-
-                rgb=hsv2rgb(hres,sres,vres)
-                col_IMG[i,j,:]=rgb[:]
-            elif mix_type=='rgb':
-                rgb=np.zeros(3)
-                for lam_id in range(len(lam_hues)):
-                    rgb+=IMGs[i,j,lam_id]*cols[lam_id,:]
-                for k in range(3):
-                    if rgb[k]>1:
-                        col_IMG[i,j,k]=1.0 
-                    else:
-                        col_IMG[i,j,k]=rgb[k]
-
-    for i in range(consts[0]):
-        for j in range(consts[1]):
-            for k in range(3):
-                if col_IMG[i,j,k]<-small:
-                    col_IMG[i,j,k]=frame_col
+    col_IMG=np.zeros((consts[0],consts[1],3),dtype=np.float32)
+    cos_h,sin_h,cols=_get_hue_tables(lam_hues)
+    if mix_type=='mt':
+        ncol=np.sum(IMGs>small,axis=2)
+        Is=np.where(IMGs>small,IMGs,0.0)
+        # V*e^(i(hue)) #I0 was multiplied when determining grey images.
+        xres=np.dot(Is,cos_h)
+        yres=np.dot(Is,sin_h)
+        #Largest and third largest intensities. Third largest is 0 if less
+        #than three fluorophores are present.
+        if consts[2]>2:
+            Is=np.partition(Is,(-3,-1),axis=2)
+            top1,top3=[Is[:,:,-1],Is[:,:,-3]]
+        else:
+            top1=Is.max(axis=2)
+            top3=np.zeros(top1.shape)
+        #No fluorescence; black background (by default)
+        fl=ncol>0
+        #arctan2 returns between [-pi,pi]. Dividing it by 2pi yields
+        # [-0.5,0.5]
+        hres=np.arctan2(yres[fl],xres[fl])/(2*np.pi)
+        #this makes hres [0,1]
+        hres[hres<0]+=1
+        vres=top1[fl] #Largest value
+        if np.any(vres>1):
+            raise Exception("Color's Value is more than 1!")
+        #Color should be saturated, sres is 1 unless ncol>2
+        sres=1-top3[fl]/vres
+        if np.any(sres<0) or np.any(sres>1):
+            raise Exception("Color's saturation is more than 1")
+        col_IMG[fl]=hsv2rgb_vec(hres,sres,vres)
+    elif mix_type=='rgb':
+        col_IMG=np.minimum(np.dot(IMGs,cols),1.0)
+
+    #if all Img_dat are -1 then res is -1
+    col_IMG[np.all(IMGs<=-small,axis=2)]=-1
+    col_IMG[col_IMG<-small]=frame_col
+
+    return col_IMG
+
+def get_bounds(I):
+    """ Finds the region of a monochrome image inside the white frame.
+
+    The frame is detected along the central row and column of the image.
 
-    return col_IMG  
+    Parameters
+    ----------
+    I:
+        see ''add_noise''
+
+    Returns
+    -------
+    x0, xL, y0, yL: int
+        The region I[x0:x0+xL,y0:y0+yL] is not part of the white frame. xL and
+        yL are 0 if the image is entirely white frame.
+    """
+    dims=I.shape
+    xs=np.flatnonzero(I[:,int(dims[1]/2)-1]>-0.5)
+    ys=np.flatnonzero(I[int(dims[0]/2)-1,:]>-0.5)
+    if len(xs)==0 or len(ys)==0:
+        return 0,0,0,0
+    return xs[0],len(xs),ys[0],len(ys)
 
 def add_noise(I,poi,gauss):
     """ Adds a Poisson-Gaussian noise to a monochrome image
@@ -493,32 +691,19 @@ def add_noise(I,poi,gauss):
     -------
     I: Monochrome image with noise. Axes XY.
     """
-    dims=I.shape
-    x0,y0,xL,yL=[0,0,0,0]
-    for i in range(dims[0]):
-        if I[i,int(dims[1]/2)-1]==-1 and xL==0:
-            x0+=1
-        elif I[i,int(dims[1]/2)-1]>-0.5:
-            xL+=1       
-    for j in range(dims[1]):
-        if I[int(dims[0]/2)-1,j]==-1 and yL==0:
-            y0+=1
-        elif I[int(dims[0]/2)-1,j]>-0.5:
-            yL+=1   
-    for i in range(x0,x0+xL):
-        for j in range(y0,y0+yL):
-            P=np.random.poisson(lam=255*I[i,j])
-            G=np.random.normal(loc=0.0,scale=gauss)
-            I[i,j]=G+poi*P/255.0+I[i,j]*(1-poi)
-            if I[i,j]>1:
-                I[i,j]=1.0
-            if I[i,j]<0: #Note that the space of i,j here is not the backgroumd
-                I[i,j]=0.0
+    x0,xL,y0,yL=get_bounds(I)
+    if xL==0:
+        return I
+    sub=I[x0:x0+xL,y0:y0+yL]
+    P=np.random.poisson(lam=np.clip(255*sub,0,None))
+    G=np.random.normal(loc=0.0,scale=gauss,size=sub.shape)
+    #Note that the space of sub here is not the backgroumd
+    I[x0:x0+xL,y0:y0+yL]=np.clip(G+poi*P/255.0+sub*(1-poi),0,1)
     #frame color will be taken care by add_color or separately for monochrome images
 
     return I
 
-def intensity2image(I,dtype):
+def intensity2image(I,dtype,out=None,overwrite=False):
     """ Converts float intensities to a different data type. Maximum intensity 
         is set to maxI
 
@@ -528,16 +713,24 @@ def intensity2image(I,dtype):
         see ''add_noise''
     dtype:
         Output image datatype 
+    out: array of dtype, optional
+        Array (or view, e.g. a transposed one) with the shape of I in which 
+        the converted image is stored.
+    overwrite: bool
+        If True, the float array I is scaled in place instead of in a 
+        temporary copy. I is not usable afterwards.
  
     Returns
     -------
     I: Converted monochrome image
     """
     maxI=np.iinfo(dtype).max
-    I=I*maxI
-    I[I>maxI]=maxI
-    I[I<0]=0
-    return I.astype(dtype)
+    I=np.multiply(I,maxI,out=I if overwrite else None)
+    np.clip(I,0,maxI,out=I)
+    if out is None:
+        return I.astype(dtype,copy=False)
+    np.copyto(out,I,casting='unsafe')
+    return out
 
 def plot_lumin(filename, lam_I0s, lams, lam_hues, T, ti, fs, MaxBox):
     """ Interactively plot small portions of colored the in-silico microscopy
@@ -587,23 +780,17 @@ def plot_lumin(filename, lam_I0s, lams, lam_hues, T, ti, fs, MaxBox):
         vals=[x,consts[0]-x,y,consts[1]-y]
         if min(vals)<width:
             width=min(vals)
-        d=[]
-        Lumin=[]
-        Hue=[]
-        for i in range(-width,width+1):
-            for j in range(-width,width+1):
-                d.append(np.sqrt(i**2+j**2)) 
-                rgb=copy.deepcopy(col_IMGs[i+x,j+y,:])
-                for k in range(3):
-                   if rgb[k]<=0.03928:
-                       rgb[k]=rgb[k]/12.92
-                   else:
-                       rgb[k]=((rgb[k]+0.055)/1.055)**2.4
-                #Reference: https://www.w3.org/Graphics/Color/sRGB.html 
-                #Check the published work for the accurate reference.
-                hsv=rgb2hsv(rgb[0],rgb[1],rgb[2])
-                Hue.append(hsv[0]*360)
-                Lumin.append(0.2126*rgb[0]+0.7152*rgb[1]+0.0722*rgb[2])
+        patch=col_IMGs[x-width:x+width+1,y-width:y+width+1].astype(float)
+        #Reference: https://www.w3.org/Graphics/Color/sRGB.html
+        #Check the published work for the accurate reference.
+        with np.errstate(invalid='ignore'):
+            rgb=np.where(patch<=0.03928, patch/12.92,
+                         ((patch+0.055)/1.055)**2.4)
+        Hue=(rgb2hsv_vec(rgb)[...,0]*360).ravel()
+        Lumin=(0.2126*rgb[...,0]+0.7152*rgb[...,1]+0.0722*rgb[...,2]).ravel()
+        i,j=np.meshgrid(np.arange(-width,width+1), np.arange(-width,width+1),
+                        indexing='ij')
+        d=np.sqrt(i**2+j**2).ravel()
         fig,ax=plt.subplots(1, 3, figsize=(img_width*3, img_hei))
         ax[0].set_xticks([])
         ax[0].set_yticks([])
@@ -682,14 +869,10 @@ def get_region(filename, lam_I0s, lams, lam_hues, T, ti, fs, MaxBox, \
     """
     col_IMGs=get_col_img(filename, lam_I0s, lams, lam_hues, T, ti, fs, MaxBox, \
         mix_type=mix_type)
-    consts=col_IMGs.shape
-    for i in range(consts[0]):
-        for j in range(consts[1]):
-            hsv=rgb2hsv(col_IMGs[i,j,0],col_IMGs[i,j,1],col_IMGs[i,j,2])
-            hsv[0]=int(hsv[0]*36)/36
-            rgb=hsv2rgb(hsv[0],hsv[1],1)
-            col_IMGs[i,j,:]=rgb[:]
-    return col_IMGs   
+    hsv=rgb2hsv_vec(col_IMGs)
+    h=np.floor(hsv[...,0]*36)/36
+    hsv2rgb_vec(h,hsv[...,1],1.0,out=col_IMGs)
+    return col_IMGs
 
 def plot_region(filename, lam_I0s, lams, lam_hues, T, ti, fs, MaxBox, Bm,
     scale, dpi=600, outfile=None, frame_col=1.0):
@@ -740,20 +923,64 @@ def plot_region(filename, lam_I0s, lams, lam_hues, T, ti, fs, MaxBox, Bm,
 
 def plot_grey_img(filename, lam_I0s, lams, T, ti, fs, MaxBox, Bm, scale, 
     dpi=600, outfile=None, frame_col=1.0, noise=False, poi=None, gauss=None,
-    otype='jpeg', psf_type=0, tsO=None):
+    otype='jpeg', psf_type=0, tsO=None, pool=None):
     """ Plots monochrome image with a scale.
     
     See functions get_grey_img, add_scale and plot_ism for more details.
+    Images of different fluorophore types are plotted parallelly if they are
+    saved to a file and more than one CPU is available.
+
+    Parameters
+    ----------
+    pool: multiprocessing.Pool, optional
+        Pool from ''_lam_pool'' used to plot the fluorophore types. If None,
+        a pool is created and closed within this call when needed. Callers 
+        plotting several timesteps should pass one pool.
     """
+    Arguments=[]
     for i in range(len(lams)):
-        IMG=get_grey_img(filename, lam_I0s[i], lams[i], T, ti, fs, MaxBox, 
-            frame=True, noise=noise, poi=poi, gauss=gauss, 
-            psf_type=psf_type, tsO=tsO)
-        if otype in ['jpeg', 'png']:
-            IMG=add_scale(IMG, scale, Bm)
-        plot_ism(IMG, [lam_I0s[i]], [lams[i]], T, ti, fs, filename=outfile,
-                 dpi=dpi, otype=otype, psf_type=psf_type, tsO=tsO,
-                 frame_col=frame_col)
+        Arguments.append((filename, lam_I0s[i], lams[i], T, ti, fs, MaxBox, Bm,
+            scale, dpi, outfile, frame_col, noise, poi, gauss, otype, psf_type,
+            tsO))
+    if outfile==None: #Images cannot be shown from other processes
+        pool=None
+    own_pool=pool is None
+    if own_pool:
+        pool=_lam_pool(len(lams),outfile)
+    if pool is None:
+        for args in Arguments:
+            plot_grey_lam(*args)
+        return
+    try:
+        pool.starmap(plot_grey_lam,Arguments)
+    finally:
+        if own_pool:
+            pool.terminate()
+
+def _lam_pool(nlam, outfile):
+    """ Returns a pool to plot nlam fluorophore types in parallel with 
+        ''plot_grey_img'', or None if they are plotted serially: if only one
+        worker would run, if images are shown (outfile is None), or within a
+        pool worker, which cannot fork.
+    """
+    cpus=min(nlam,_NCPU)
+    if cpus>1 and outfile!=None and not mp.current_process().daemon:
+        return worker_pool(cpus,backend='Agg')
+    return None
+
+def plot_grey_lam(filename, lam_I0, lam, T, ti, fs, MaxBox, Bm, scale, dpi,
+    outfile, frame_col, noise, poi, gauss, otype, psf_type, tsO):
+    """ Plots monochrome image of one fluorophore type. Used by plot_grey_img.
+
+    See plot_grey_img for more details. lam_I0 and lam are elements of lam_I0s
+    and lams.
+    """
+    IMG=get_grey_img(filename, lam_I0, lam, T, ti, fs, MaxBox, frame=True,
+        noise=noise, poi=poi, gauss=gauss, psf_type=psf_type, tsO=tsO)
+    if otype in ['jpeg', 'png']:
+        IMG=add_scale(IMG, scale, Bm)
+    plot_ism(IMG, [lam_I0], [lam], T, ti, fs, filename=outfile, dpi=dpi,
+             otype=otype, psf_type=psf_type, tsO=tsO, frame_col=frame_col)
 
 def plot_col_img(filename, lam_I0s, lams, lam_hues, T, ti, fs, MaxBox, Bm, 
     scale, dpi=600, outfile=None, frame_col=1.0, mix_type='mt', noise=False,
@@ -790,12 +1017,204 @@ def plot_col_img(filename, lam_I0s, lams, lam_hues, T, ti, fs, MaxBox, Bm,
         plot_ism(IMG,  lam_I0s,  lams,  T,  ti,  fs,  filename=outfile,  dpi=dpi, 
             otype=otype, psf_type=psf_type, tsO=tsO, frame_col=frame_col)
 
+def _to_page(I, dtype, out=None):
+    """ Converts intensities with axes XY or XYC to a C-contiguous image with
+        axes YX or CYX, stored in out if it is not None. See 
+        ''intensity2image''. I is overwritten.
+    """
+    if out is None:
+        out=np.empty(I.shape[::-1],dtype=dtype)
+    if I.max()<=0: #Empty plane, e.g. outside the specimen or only frame
+        out.fill(0)
+    else:
+        intensity2image(I,dtype,out=np.transpose(out),overwrite=True)
+    return out
+
+def _grey_page(args):
+    """ Calls get_grey_img(*args[1:]) and returns the image of data type 
+        args[0] with axes YX. Used with Pool.map/imap, which pass a single 
+        argument, so that the conversion runs in the pool workers.
+    """
+    return _to_page(get_grey_img(*args[1:]),args[0])
+
+def _col_page(args):
+    """ Calls get_col_img(*args[1:]) and returns the image of data type 
+        args[0] with axes CYX. See ''_grey_page''.
+    """
+    return _to_page(get_col_img(*args[1:]),args[0])
+
+def _imap_chunksize(ntasks):
+    """ Number of tasks sent to a pool worker at a time by Pool.imap. Same as
+        the default for Pool.starmap, about four chunks per process.
+    """
+    return max(1,ntasks//(4*_NCPU))
+
+def _imap_bounded(pool, func, Arguments, depth=None):
+    """ Yields func(args) for args in Arguments, in order, computed by pool.
+        Unlike Pool.imap, at most depth tasks are submitted and not yet 
+        consumed, so that results are not queued faster than they are used.
+        depth is 2*_NCPU by default, which keeps all workers busy.
+    """
+    if depth is None:
+        depth=2*_NCPU
+    pending=collections.deque()
+    for args in Arguments:
+        pending.append(pool.apply_async(func,(args,)))
+        if len(pending)>=depth:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+def _indexed_call(args):
+    """ Returns (args[0], args[1](args[2])). Used with Pool.imap_unordered, 
+        so that results can be placed as they arrive.
+    """
+    return args[0],args[1](args[2])
+
+def _fill_unordered(img3d, func, Arguments, pool=None):
+    """ Stores func(Arguments[n]) in img3d[nN-n-1] as the pool workers finish,
+        in whichever order they finish. Used by ''get_grey_3dimg'' and 
+        ''get_col_3dimg''.
+
+    Parameters
+    ----------
+    img3d: array of ints
+        3D image with axes Z(C)YX.
+    func: function
+        ''_grey_page'' or ''_col_page''.
+    Arguments: list of tuples
+        Arguments of func for slice n=0,1,..,nN-1.
+    pool: multiprocessing.Pool, optional
+        If None, a pool is created and closed within this call.
+    """
+    nN=len(Arguments)
+    tasks=[(n,func,Arguments[n]) for n in range(nN)]
+    own_pool=pool is None
+    if own_pool:
+        pool=worker_pool(_NCPU)
+    try:
+        for n,page in pool.imap_unordered(_indexed_call,tasks,
+            chunksize=_imap_chunksize(nN)):
+            img3d[nN-n-1]=page
+    finally:
+        if own_pool:
+            pool.terminate()
+
+def _iter_pages(images):
+    """ Yields the tiff pages of images as they are computed.
+
+    Parameters
+    ----------
+    images: iterable of arrays of ints
+        Monochrome (axes YX) or color (axes CYX) images, such as those from
+        ''_grey_page'' or ''_col_page''.
+
+    Yields
+    ------
+    page: 2D image with axes YX. Color images yield one page per channel.
+    """
+    for img in images:
+        if img.ndim==2:
+            yield img
+        else:
+            yield from img
+
+def _iter_tiles(pages, tile):
+    """ Splits 2D pages into tiles, row by row, in the order tifffile writes 
+        them. Edge tiles are not padded.
+    """
+    for page in pages:
+        for y in range(0,page.shape[0],tile[0]):
+            for x in range(0,page.shape[1],tile[1]):
+                yield page[y:y+tile[0],x:x+tile[1]]
+
+def _write_tiff(oname, data, resolution, metadata, shape=None, dtype=None):
+    """ Writes a 2DT, 3D, or 3DT image as a compressed ImageJ hyperstack. 
+        Images larger than bigtiff_size are written as tiled BigTIFF files, 
+        compressed in parallel. ImageJ opens these with Bio-Formats.
+
+    Parameters
+    ----------
+    oname: str
+        Output filename.
+    data: array of ints or iterable of 2D arrays of ints
+        Image, or its pages (axes YX) in the order they are written.
+    resolution: tuple of floats
+        Pixels per unit length in X and Y.
+    metadata: dict
+        ImageJ metadata including 'axes'. For BigTIFF files it is saved in 
+        the image description.
+    shape: tuple of ints
+        Shape of the image. Required if data is an iterable of pages.
+    dtype: numpy dtype
+        Data type of the image. Required if data is an iterable of pages.
+    """
+    if shape is None:
+        nbytes=data.nbytes
+    else:
+        nbytes=np.prod(shape)*np.dtype(dtype).itemsize
+    if nbytes<bigtiff_size:
+        tif.imwrite(oname, data, shape=shape, dtype=dtype, imagej=True, 
+            resolution=resolution, metadata=metadata, **tiff_compression)
+    else:
+        if shape is not None: #Pages are streamed tile by tile
+            data=_iter_tiles(data,tiff_tile)
+        tif.imwrite(oname, data, shape=shape, dtype=dtype, bigtiff=True, 
+            tile=tiff_tile, photometric='minisblack', 
+            maxworkers=_NCPU, resolution=resolution, 
+            metadata=metadata, **tiff_compression)
+
+def _schedule_and_write(func, Arguments, outputs, dtype, resolution, 
+    mprocess=True):
+    """ Computes the images func(Arguments[k]) and streams them into one or 
+        more tiff files. Used by all 2DT, 3D and 3DT plotting functions, so 
+        that the multiprocessing and tiff writing are done in one place.
+
+    Parameters
+    ----------
+    func: function
+        ''_grey_page'' or ''_col_page''.
+    Arguments: list of tuples
+        Arguments of func, in the order the images are written. Each file 
+        uses len(Arguments)/len(outputs) consecutive images.
+    outputs: list of tuples
+        (oname, metadata, shape) of each file. See ''_write_tiff''.
+    dtype: numpy dtype
+        Data type of the images.
+    resolution: tuple of floats
+        Pixels per unit length in X and Y.
+    mprocess: bool
+        If True, the images are computed by a pool of ''_NCPU'' processes 
+        while earlier images are written. Only a few images per process are
+        held in memory, see ''_imap_bounded''.
+    """
+    pool=None
+    if mprocess==True: #Multiprocess
+        pool=worker_pool(_NCPU)
+        results=_imap_bounded(pool,func,Arguments)
+    else: #Serial
+        results=map(func,Arguments)
+
+    nimg=len(Arguments)//len(outputs)
+    try:
+        for oname,metadata,shape in outputs:
+            print('Writing: '+oname)
+            pages=_iter_pages(itertools.islice(results,nimg))
+            _write_tiff(oname, pages, resolution, metadata, shape=shape, 
+                dtype=dtype)
+    finally:
+        if pool is not None:
+            pool.terminate()
+
 def get_grey_3dimg(filename, lam_I0, lam, T, ti, fs, MaxBox, dlmn, nmax,
     opt_axis, add_n=1, outfile=None, otype='tiff8', mprocess=True, noise=False,
-    poi=None, gauss=None, psf_type=0, tsO=None):
-    """ Creates 3D monochrome images.
+    poi=None, gauss=None, psf_type=0, tsO=None, pool=None, out=None):
+    """ Creates a 3D monochrome image and returns it as an array.
 
-    See ''get_grey_img'' for details, lam_I0 is I0 in ''get_grey_img''
+    The plot_* functions stream slices to tiff files instead, see 
+    ''_schedule_and_write''. This function is for scripts that need the 
+    whole image in memory. See ''get_grey_img'' for details, lam_I0 is I0 in
+    ''get_grey_img''
     Parameters
     ----------
     dlmn: array of floats
@@ -804,6 +1223,16 @@ def get_grey_3dimg(filename, lam_I0, lam, T, ti, fs, MaxBox, dlmn, nmax,
     add_n: int
         Maximum coodinate in n direction is nmax*dlmn[2]. 3D images contains
         2D images from n=range(0,nmax,add_n)*dlmn[2].
+    pool: multiprocessing.Pool, optional
+        Pool used when mprocess is True. If None, a pool is created and closed
+        within this call. Scripts building several 3D images can pass one
+        pool so that worker processes are not respawned for every image. 
+        Create it with ''worker_pool'' so that the workers use cache_dat.
+    out: 3D array of ints, optional
+        Array of shape (nN,MaxBox[1],MaxBox[0]) in which the image is stored.
+        Scripts building several 3D images one at a time can pass the array
+        returned by the previous call to reuse it. If None, a new array is
+        allocated.
 
     Returns
     -------
@@ -812,29 +1241,24 @@ def get_grey_3dimg(filename, lam_I0, lam, T, ti, fs, MaxBox, dlmn, nmax,
 
     nN=int(nmax/add_n)
     xyz='xyz'
-    if otype in ["tiff16","tif16"]:
-        img3d=np.zeros((nN,MaxBox[1],MaxBox[0]),dtype=np.uint16)
+    if out is not None:
+        img3d=out
+    elif otype in ["tiff16","tif16"]:
+        img3d=np.empty((nN,MaxBox[1],MaxBox[0]),dtype=np.uint16)
     elif otype in ["tiff8", "tif8"]:
-        img3d=np.zeros((nN,MaxBox[1],MaxBox[0]),dtype=np.uint8)
+        img3d=np.empty((nN,MaxBox[1],MaxBox[0]),dtype=np.uint8)
 
+    Arguments=[]
+    for n in range(nN):
+        Arguments.append((img3d.dtype, filename, lam_I0, lam, T, ti, fs, \
+            MaxBox, True, opt_axis, n*add_n, 0, noise, poi, gauss, psf_type, 
+            tsO))
     if mprocess==True: #Multiprocess
-        Arguments=[]
+        _fill_unordered(img3d,_grey_page,Arguments,pool)
+    else: #Serial, converted directly into img3d
         for n in range(nN):
-            Arguments.append((filename, lam_I0, lam, T, ti, fs, MaxBox, True, \
-                opt_axis, n*add_n, 0, noise, poi, gauss, psf_type, tsO))
-        pool=mp.Pool(mp.cpu_count())
-        results=pool.starmap(get_grey_img,Arguments)
-    else: #Serial
-        results=[]
-        for n in range(nN):
-            results.append(get_grey_img(filename, lam_I0, lam, T, ti, fs,
-                MaxBox, True, opt_axis, n*add_n, 0, noise, poi, gauss,
-                psf_type, tsO))
-
-    for n in range(nN):
-        foo=intensity2image(results[n],img3d.dtype)
-        foo=np.transpose(foo)
-        img3d[nN-n-1,:,:]=foo[:,:]
+            _to_page(get_grey_img(*Arguments[n][1:]),img3d.dtype,
+                out=img3d[nN-n-1])
 
     return img3d
 
@@ -849,21 +1273,30 @@ def plot_grey_3dimg(filename, lam_I0s, lams, T, ti, fs, MaxBox, dlmn, nmax,
     lams:    see ''get_col_img''
     """
 
-    tstr=''
+    nN=int(nmax/add_n)
     xyz='xyz'
+    if otype in ["tiff16","tif16"]:
+        dtype=np.uint16
+    elif otype in ["tiff8", "tif8"]:
+        dtype=np.uint8
+    tstr=''
     if psf_type==1:
         tstr='_tsO'+"%g"%tsO
+    #Slices in the order they are written, n is reversed along Z.
+    Arguments=[]
+    outputs=[]
     for l in range(len(lams)):
-        img3d=get_grey_3dimg(filename, lam_I0s[l], lams[l], T, ti, fs, MaxBox,
-            dlmn, nmax, opt_axis, add_n=add_n, outfile=outfile, otype=otype,
-            mprocess=mprocess, noise=noise, poi=poi, gauss=gauss, 
-            psf_type=psf_type, tsO=tsO)
-        oname=outfile +str(ti) +'_'+xyz[opt_axis] +tstr +'_lam'+str(lams[l]) +\
-            '_fs'+str(fs) +'_T'+str(T) +'_I'+str(lam_I0s[l]) +'.tiff'
-        print('Writing: '+oname)
-        tif.imwrite(oname, img3d, imagej=True, resolution=(1./dlmn[0], 
-             1./dlmn[1]), metadata={'spacing': dlmn[2], 'unit': 'nm', 
-             'axes': 'ZYX'})
+        for n in range(nN-1,-1,-1):
+            Arguments.append((dtype, filename, lam_I0s[l], lams[l], T, ti, 
+                fs, MaxBox, True, opt_axis, n*add_n, 0, noise, poi, gauss, 
+                psf_type, tsO))
+        oname=outfile +str(ti) +'_'+xyz[opt_axis] +tstr +'_lam' + \
+            str(lams[l]) +'_fs'+str(fs) +'_T'+str(T) +'_I' + \
+            str(lam_I0s[l]) +'.tiff'
+        outputs.append((oname, {'spacing': dlmn[2], 'unit': 'nm', 
+            'axes': 'ZYX'}, (nN,MaxBox[1],MaxBox[0])))
+    _schedule_and_write(_grey_page, Arguments, outputs, dtype, 
+        (1./dlmn[0], 1./dlmn[1]), mprocess=mprocess)
     
 def plot_grey_3dtimg(filename, lam_I0s, lams, T, tbegin, tmax, tdiff, fs, 
     MaxBox, dlmn, nmax, opt_axis, fps, add_n=1, outfile=None, otype='tiff8', 
@@ -890,32 +1323,30 @@ def plot_grey_3dtimg(filename, lam_I0s, lams, T, tbegin, tmax, tdiff, fs,
     tN=int((tmax-1-tbegin)/tdiff)+1
     xyz='xyz'
     if otype in ["tiff16","tif16"]:
-        img3dt=np.zeros((tN,nN,MaxBox[1],MaxBox[0]),dtype=np.uint16)
+        dtype=np.uint16
     elif otype in ["tiff8", "tif8"]:
-        img3dt=np.zeros((tN,nN,MaxBox[1],MaxBox[0]),dtype=np.uint8)
+        dtype=np.uint8
 
     tstr=''
     if psf_type==1:
         tstr='_tsO'+"%g"%tsO
-    #Check if all tiff exists
-    nname=''
-    if noise:
-        nname='noise_'
+    #Slices in the order they are written, n is reversed along Z.
+    Arguments=[]
+    outputs=[]
     for l in range(len(lams)):
         for i in range(tN):
             ti=tbegin+tdiff*i
-            img3d=get_grey_3dimg(filename, lam_I0s[l], lams[l], T, ti, fs, 
-                MaxBox, dlmn, nmax, opt_axis, add_n=add_n, outfile=outfile, 
-                otype=otype, mprocess=mprocess, noise=noise, poi=poi, 
-                gauss=gauss, psf_type=psf_type, tsO=tsO)
-            img3dt[i,:,:,:]=img3d[:,:,:]
-        oname=outfile +str(tbegin)+'-'+str(tmax) + '_'+xyz[opt_axis] +tstr + \
-            '_lam'+str(lams[l]) +'_fs'+str(fs) +'_T'+str(T) +'_I'+ \
+            for n in range(nN-1,-1,-1):
+                Arguments.append((dtype, filename, lam_I0s[l], lams[l], T, 
+                    ti, fs, MaxBox, True, opt_axis, n*add_n, 0, noise, poi, 
+                    gauss, psf_type, tsO))
+        oname=outfile +str(tbegin)+'-'+str(tmax) + '_'+xyz[opt_axis] + \
+            tstr +'_lam'+str(lams[l]) +'_fs'+str(fs) +'_T'+str(T) +'_I'+ \
             str(lam_I0s[l]) +'.tiff'
-        print('Writing: '+oname)
-        tif.imwrite(oname, img3dt, imagej=True, resolution=(1./dlmn[0], 
-            1./dlmn[1]), metadata={'spacing': dlmn[2], 'unit': 'nm', 
-            'finterval': fps, 'axes': 'TZYX'})
+        outputs.append((oname, {'spacing': dlmn[2], 'unit': 'nm', 
+            'finterval': fps, 'axes': 'TZYX'}, (tN,nN,MaxBox[1],MaxBox[0])))
+    _schedule_and_write(_grey_page, Arguments, outputs, dtype, 
+        (1./dlmn[0], 1./dlmn[1]), mprocess=mprocess)
 
 def plot_grey_2dtimg(filename, lam_I0s, lams, T, tbegin, tmax, tdiff, fs, 
     MaxBox, dlmn, fps, outfile=None, otype='tiff8', mprocess=True, noise=False,
@@ -926,47 +1357,34 @@ def plot_grey_2dtimg(filename, lam_I0s, lams, T, tbegin, tmax, tdiff, fs,
     
     tN=int((tmax-1-tbegin)/tdiff)+1
     if otype in ["tiff16","tif16"]:
-        img2dt=np.zeros((tN,MaxBox[1],MaxBox[0]),dtype=np.uint16)
+        dtype=np.uint16
     elif otype in ["tiff8", "tif8"]:
-        img2dt=np.zeros((tN,MaxBox[1],MaxBox[0]),dtype=np.uint8)
+        dtype=np.uint8
     tstr=''
     if psf_type==1:
         tstr='_tsO'+"%g"%tsO
-    #Check if all tiff exists
+    Arguments=[]
+    outputs=[]
     for l in range(len(lams)):
-        if mprocess==True: #Multiprocess
-            Arguments=[]
-            for i in range(tN):
-                ti=tbegin+tdiff*i
-                Arguments.append((filename, lam_I0s[l], lams[l], T, ti, fs, 
-                    MaxBox, True, None, None, 0, noise, poi, gauss, 
-                    psf_type, tsO))
-            pool=mp.Pool(mp.cpu_count())
-            results=pool.starmap(get_grey_img,Arguments)
-        else: #Serial
-            results=[]
-            for i in range(tN):
-                ti=tbegin+tdiff*i
-                results.append(get_grey_img(filename, lam_I0s[l], lams[l], T, ti, 
-                    fs, MaxBox, True, None, None, 0, noise, poi, gauss,
-                    psf_type, tsO))
-
         for i in range(tN):
-            foo=intensity2image(results[i],img2dt.dtype)
-            foo=np.transpose(foo)
-            img2dt[i,:,:]=foo[:,:]
-        oname=outfile +str(tbegin)+'-'+str(tmax) +tstr +'_lam'+str(lams[l]) + \
-            '_fs'+str(fs) +'_T'+str(T) +'_I'+str(lam_I0s[l]) +'.tiff'
-        print('Writing: '+oname)
-        tif.imwrite(oname, img2dt, imagej=True, resolution=(1./dlmn[0], 
-            1./dlmn[1]), metadata={'unit': 'nm', 'finterval': fps, 
-            'axes': 'TYX'})
+            ti=tbegin+tdiff*i
+            Arguments.append((dtype, filename, lam_I0s[l], lams[l], T, ti, fs,
+                MaxBox, True, None, None, 0, noise, poi, gauss, psf_type, tsO))
+        oname=outfile +str(tbegin)+'-'+str(tmax) +tstr +'_lam' + \
+            str(lams[l]) +'_fs'+str(fs) +'_T'+str(T) +'_I' + \
+            str(lam_I0s[l]) +'.tiff'
+        outputs.append((oname, {'unit': 'nm', 'finterval': fps, 
+            'axes': 'TYX'}, (tN,MaxBox[1],MaxBox[0])))
+    _schedule_and_write(_grey_page, Arguments, outputs, dtype, 
+        (1./dlmn[0], 1./dlmn[1]), mprocess=mprocess)
 
 def get_col_3dimg(filename, lam_I0s, lams, lam_hues, T, ti, fs, MaxBox, dlmn, 
     nmax, opt_axis, add_n=1, outfile=None, otype='tiff8', mprocess=True, 
-    noise=False, poi=None, gauss=None, mix_type='mt', psf_type=0, tsO=None):
-    """ Creates 3D color images. See ''get_col_img'' for details. For dlmn,
-        nmax, add_n see ''get_grey_3dimg''.
+    noise=False, poi=None, gauss=None, mix_type='mt', psf_type=0, tsO=None,
+    pool=None, out=None):
+    """ Creates a 3D color image and returns it as an array. See 
+        ''get_col_img'' for details. For dlmn, nmax, add_n, pool, and out see
+        ''get_grey_3dimg''; out has shape (nN,C,MaxBox[1],MaxBox[0]).
 
     Returns
     -------
@@ -977,30 +1395,24 @@ def get_col_3dimg(filename, lam_I0s, lams, lam_hues, T, ti, fs, MaxBox, dlmn,
     C=3 #3 color channels for 'mt' image
     if mix_type=='none': #Colors are not mixed.
         C=len(lams)
-    if otype in ["tiff16","tif16"]:
-        img3d=np.zeros((nN,C,MaxBox[1],MaxBox[0]),dtype=np.uint16)
+    if out is not None:
+        img3d=out
+    elif otype in ["tiff16","tif16"]:
+        img3d=np.empty((nN,C,MaxBox[1],MaxBox[0]),dtype=np.uint16)
     elif otype in ["tiff8", "tif8"]:
-        img3d=np.zeros((nN,C,MaxBox[1],MaxBox[0]),dtype=np.uint8)
+        img3d=np.empty((nN,C,MaxBox[1],MaxBox[0]),dtype=np.uint8)
 
+    Arguments=[]
+    for n in range(nN):
+        Arguments.append((img3d.dtype, filename, lam_I0s, lams, lam_hues, T, 
+            ti, fs, MaxBox, mix_type, opt_axis, n*add_n, noise, poi, gauss,
+            psf_type, tsO))
     if mprocess==True: #Multiprocess
-        Arguments=[]
+        _fill_unordered(img3d,_col_page,Arguments,pool)
+    else: #Serial, converted directly into img3d
         for n in range(nN):
-            Arguments.append((filename, lam_I0s, lams, lam_hues, T, ti, fs, 
-                MaxBox, mix_type, opt_axis, n*add_n, noise, poi, gauss,
-                psf_type, tsO))
-        pool=mp.Pool(mp.cpu_count())
-        results=pool.starmap(get_col_img,Arguments)
-    else: #Serial
-        results=[]
-        for n in range(nN):
-            results.append(get_col_img(filename, lam_I0s, lams, lam_hues, 
-                T, ti, fs, MaxBox, mix_type, opt_axis, n*add_n, 
-                noise, poi, gauss, psf_type, tsO))
-    
-    for n in range(nN):
-        foo=intensity2image(results[n],img3d.dtype) # Axes XYC
-        foo=np.transpose(foo,(2,1,0)) # Axes CYX
-        img3d[nN-n-1,:,:,:]=foo[:,:,:] 
+            _to_page(get_col_img(*Arguments[n][1:]),img3d.dtype,
+                out=img3d[nN-n-1])
 
     return img3d
 
@@ -1010,22 +1422,33 @@ def plot_col_3dimg(filename, lam_I0s, lams, lam_hues, T, ti, fs, MaxBox, dlmn,
     """ Plots 3D color images. See ''get_col_3dimg'' for details.
 
     """
-    Istring=''
+    nN=int(nmax/add_n)
+    C=3 #3 color channels for 'mt' image
+    if mix_type=='none': #Colors are not mixed.
+        C=len(lams)
     xyz='xyz'
+    if otype in ["tiff16","tif16"]:
+        dtype=np.uint16
+    elif otype in ["tiff8", "tif8"]:
+        dtype=np.uint8
+    Istring=''
     for i in range(len(lams)):
         Istring+='_'+str(lam_I0s[i])
     tstr=''
     if psf_type==1:
         tstr='_tsO'+"%g"%tsO
-    img3d=get_col_3dimg(filename, lam_I0s, lams, lam_hues, T, ti, fs, MaxBox,
-        dlmn, nmax, opt_axis, add_n=add_n, outfile=outfile, otype=otype, 
-        mprocess=mprocess, noise=noise, poi=poi, gauss=gauss, 
-        mix_type=mix_type, psf_type=psf_type, tsO=tsO)
+    #Slices in the order they are written, n is reversed along Z.
+    Arguments=[]
+    for n in range(nN-1,-1,-1):
+        Arguments.append((dtype, filename, lam_I0s, lams, lam_hues, T, ti, 
+            fs, MaxBox, mix_type, opt_axis, n*add_n, noise, poi, gauss, 
+            psf_type, tsO))
     oname=outfile+str(ti) + '_'+xyz[opt_axis] +tstr +'_fs'+str(fs) +'_T' + \
         str(T) +'_I'+Istring+'.tiff'
-    print('Writing: '+oname)
-    tif.imwrite(oname, img3d, imagej=True, resolution=(1./dlmn[0],1./dlmn[1]),
-        metadata={'spacing': dlmn[2], 'unit': 'nm', 'axes': 'ZCYX'})
+    outputs=[(oname, {'spacing': dlmn[2], 'unit': 'nm', 'axes': 'ZCYX'}, 
+        (nN,C,MaxBox[1],MaxBox[0]))]
+    _schedule_and_write(_col_page, Arguments, outputs, dtype, 
+        (1./dlmn[0], 1./dlmn[1]), mprocess=mprocess)
 
 def plot_col_3dtimg(filename, lam_I0s, lams, lam_hues, T, tbegin, tmax, tdiff, 
     fs, MaxBox, dlmn, nmax, opt_axis, fps, add_n=1, outfile=None, otype='tiff8', 
@@ -1043,29 +1466,29 @@ def plot_col_3dtimg(filename, lam_I0s, lams, lam_hues, T, tbegin, tmax, tdiff,
     
     xyz='xyz'
     if otype in ["tiff16","tif16"]:
-        img3dt=np.zeros((tN,nN,C,MaxBox[1],MaxBox[0]),dtype=np.uint16)
+        dtype=np.uint16
     elif otype in ["tiff8", "tif8"]:
-        img3dt=np.zeros((tN,nN,C,MaxBox[1],MaxBox[0]),dtype=np.uint8)
+        dtype=np.uint8
     Istring=''
     for i in range(len(lams)):
         Istring+='_'+str(lam_I0s[i])
     tstr=''
     if psf_type==1:  
         tstr='_tsO'+"%g"%tsO
-    #Check if all tiff exists
+    #Slices in the order they are written, n is reversed along Z.
+    Arguments=[]
     for i in range(tN):
         ti=tbegin+tdiff*i
-        img3d=get_col_3dimg(filename, lam_I0s, lams, lam_hues, T, ti, fs,
-            MaxBox, dlmn, nmax, opt_axis, add_n=add_n, outfile=outfile, 
-            otype=otype, mprocess=mprocess, noise=noise, poi=poi,
-            gauss=gauss, mix_type=mix_type, psf_type=psf_type, tsO=tsO)
-        img3dt[i,:,:,:,:]=img3d[:,:,:,:]
+        for n in range(nN-1,-1,-1):
+            Arguments.append((dtype, filename, lam_I0s, lams, lam_hues, T, 
+                ti, fs, MaxBox, mix_type, opt_axis, n*add_n, noise, poi, 
+                gauss, psf_type, tsO))
     oname=outfile +str(tbegin)+'-'+str(tmax) +'_' +xyz[opt_axis] +tstr + \
         '_fs'+str(fs) +'_T'+str(T)+ '_I'+Istring +'.tiff'
-    print('Writing: '+oname)
-    tif.imwrite(oname, img3dt, resolution=(1./dlmn[0],1./dlmn[1]), imagej=True,
-        metadata={'spacing': dlmn[2], 'unit': 'nm', 'finterval': fps, 
-        'axes': 'TZCYX'})
+    outputs=[(oname, {'spacing': dlmn[2], 'unit': 'nm', 'finterval': fps, 
+        'axes': 'TZCYX'}, (tN,nN,C,MaxBox[1],MaxBox[0]))]
+    _schedule_and_write(_col_page, Arguments, outputs, dtype, 
+        (1./dlmn[0], 1./dlmn[1]), mprocess=mprocess)
 
 def plot_col_2dtimg(filename, lam_I0s, lams, lam_hues, T, tbegin, tmax, tdiff, 
     fs, MaxBox, fps, dlmn, outfile=None, otype='tiff8', mprocess=True, noise=False, 
@@ -1079,44 +1502,27 @@ def plot_col_2dtimg(filename, lam_I0s, lams, lam_hues, T, tbegin, tmax, tdiff,
         C=len(lams)
     
     if otype in ["tiff16","tif16"]:
-        img2dt=np.zeros((tN,C,MaxBox[1],MaxBox[0]),dtype=np.uint16)
+        dtype=np.uint16
     elif otype in ["tiff8", "tif8"]:
-        img2dt=np.zeros((tN,C,MaxBox[1],MaxBox[0]),dtype=np.uint8)
+        dtype=np.uint8
     Istring=''
     for i in range(len(lams)):
         Istring+='_'+str(lam_I0s[i])
     tstr=''
     if psf_type==1:
         tstr='_tsO'+"%g"%tsO
-    #Check if all tiff exists
-    if mprocess==True: #Multiprocess
-        Arguments=[]
-        for i in range(tN):
-            ti=tbegin+tdiff*i
-            Arguments.append((filename, lam_I0s, lams, lam_hues, T, ti, fs, 
-                MaxBox, mix_type, None, None, noise, poi, gauss, psf_type,
-                tsO))
-        pool=mp.Pool(mp.cpu_count())
-        results=pool.starmap(get_col_img,Arguments)
-    else: #Serial
-        results=[]
-        for i in range(tN):
-            ti=tbegin+tdiff*i
-            results.append(get_col_img(filename, lam_I0s, lams, lam_hues, T, ti, 
-                fs, MaxBox, mix_type, None, None, noise, poi, gauss,
-                psf_type, tsO))
-
+    Arguments=[]
     for i in range(tN):
-        foo=intensity2image(results[i],img2dt.dtype)
-        foo=np.transpose(foo,(2,1,0))
-        img2dt[i,:,:,:]=foo[:,:,:]
-    
+        ti=tbegin+tdiff*i
+        Arguments.append((dtype, filename, lam_I0s, lams, lam_hues, T, ti, 
+            fs, MaxBox, mix_type, None, None, noise, poi, gauss, psf_type, 
+            tsO))
     oname=outfile +str(tbegin)+'-'+str(tmax) +tstr +'_fs'+str(fs) +'_T' + \
           str(T) +'_I'+Istring +'.tiff'
-    print('Writing: '+oname)
-    tif.imwrite(oname, img2dt, resolution=(1./dlmn[0],1./dlmn[1]), imagej=True, 
-        metadata={ 'unit': 'nm', 'finterval': fps,
-        'axes': 'TCYX'})
+    outputs=[(oname, { 'unit': 'nm', 'finterval': fps, 'axes': 'TCYX'}, 
+        (tN,C,MaxBox[1],MaxBox[0]))]
+    _schedule_and_write(_col_page, Arguments, outputs, dtype, 
+        (1./dlmn[0], 1./dlmn[1]), mprocess=mprocess)
 
 def plot_grey_serial(filename, lam_I0s, lams, T, tbegin, tmax, tdiff, fs, MaxBox,
     Bm, scale, dpi, outname, frame_col, noise, poi, gauss, otype, psf_type, 
@@ -1125,10 +1531,15 @@ def plot_grey_serial(filename, lam_I0s, lams, T, tbegin, tmax, tdiff, fs, MaxBox
 
     See plot_grey_img for more details.
     """
-    for i in range(tbegin,tmax,tdiff):
-        plot_grey_img(filename, lam_I0s, lams, T, i, fs, MaxBox, Bm, scale, dpi, 
-                      outname, frame_col, noise, poi, gauss, otype, psf_type,
-                      tsO)
+    pool=_lam_pool(len(lams),outname) #One pool for all timesteps
+    try:
+        for i in range(tbegin,tmax,tdiff):
+            plot_grey_img(filename, lam_I0s, lams, T, i, fs, MaxBox, Bm, scale,
+                          dpi, outname, frame_col, noise, poi, gauss, otype, 
+                          psf_type, tsO, pool=pool)
+    finally:
+        if pool is not None:
+            pool.terminate()
 
     
 def plot_col_serial(filename, lam_I0s, lams, lam_hues, T, tbegin, tmax, tdiff, fs, 
@@ -1155,11 +1566,11 @@ def plot_grey_mp(filename, lam_I0s, lams, T, tbegin, tmax, tdiff, fs, MaxBox, Bm
         Arguments.append([filename, lam_I0s, lams, T, i, fs, MaxBox, Bm, scale, 
                           dpi, output, frame_col, noise, poi, gauss, otype,
                           psf_type, tsO])
-    cpus=mp.cpu_count()
+    cpus=_NCPU
     if len(Arguments)<cpus:
         cpus=len(Arguments)
-    pool=mp.Pool(cpus)
-    results=pool.starmap(plot_grey_img,Arguments)
+    with worker_pool(cpus) as pool:
+        pool.starmap(plot_grey_img,Arguments)
 
 def plot_col_mp(filename, lam_I0s, lams, lam_hues, T, tbegin, tmax, tdiff, fs, 
     MaxBox, Bm, scale, dpi, output, frame_col, mix_type, noise, poi, gauss,
@@ -1173,8 +1584,8 @@ def plot_col_mp(filename, lam_I0s, lams, lam_hues, T, tbegin, tmax, tdiff, fs,
         Arguments.append([filename, lam_I0s, lams, lam_hues, T, i, fs, MaxBox, 
             Bm, scale, dpi, output,frame_col, mix_type, noise, poi, gauss, 
             otype,psf_type,tsO])
-    cpus=mp.cpu_count()
+    cpus=_NCPU
     if len(Arguments)<cpus:
         cpus=len(Arguments)
-    pool=mp.Pool(cpus)
-    results=pool.starmap(plot_col_img,Arguments)
+    with worker_pool(cpus) as pool:
+        pool.starmap(plot_col_img,Arguments)
@@ -1,13 +1,17 @@
 import unittest
+import unittest.mock
 import warnings
 import siliscopy
 import numpy as np
 import cffi
 import os
 import importlib
+import importlib.util
+import multiprocessing
 import ctypes
 import copy
 import cv2
+import tifffile
 
 class TestPSFGeneration(unittest.TestCase):
     def setUp(self):
@@ -639,7 +643,7 @@ class TestPlotImage(unittest.TestCase):
         self.I3[1:4,1:4]=[[0.15, 0.25, 0.35],[0.45,0.55,0.65],[0.75,0.85,0.95]]
 
     def tearDown(self):
-        pass
+        os.system('rm -f img*.npy')
 
     def test_noise(self):
         I1=copy.deepcopy(self.I1)
@@ -697,6 +701,10 @@ class TestPlotImage(unittest.TestCase):
         Itrue=np.ones((6,6))*-1
         Itrue[1:4,1:4]=[[0.15,0.25,0.35],[0.45,0.3166666666,0.425],[0.75,0.625,0.725]]
         self.assertTrue((abs(IMG-Itrue)<1E-6).all())
+        #frames read by a pool
+        with siliscopy.plot_image.mp_ctx.Pool(2) as pool:
+            IMG=siliscopy.plot_image.get_grey_img('img',1,100,3,10,1,[6,6],frame=True,pool=pool)
+        self.assertTrue((abs(IMG-Itrue)<1E-6).all())
         for i in range(10,13):
             os.remove('img'+str(i)+'_lam100_fs1.dat')   
 
@@ -763,6 +771,76 @@ class TestPlotImage(unittest.TestCase):
         for i in range(10,13):
             os.remove('img'+str(i)+'_z20_lam100_fs1.dat')  
 
+    def test_read_dat(self):
+        read_dat=siliscopy.plot_image.read_dat
+        writeIMG('img_lam100_fs1.dat',self.I2)
+        I=read_dat('img_lam100_fs1.dat')
+        self.assertTrue((abs(I-self.I2)<1E-6).all())
+        self.assertTrue(os.path.exists('img_lam100_fs1.npy'))
+        #A .dat file newer than its .npy file is parsed again
+        writeIMG('img_lam100_fs1.dat',self.I3)
+        t=os.path.getmtime('img_lam100_fs1.npy')
+        os.utime('img_lam100_fs1.dat',(t+10,t+10))
+        I=read_dat('img_lam100_fs1.dat')
+        self.assertTrue((abs(I-self.I3)<1E-6).all())
+        os.remove('img_lam100_fs1.dat')
+        I=read_dat('img_lam100_fs1.dat') #Updated .npy file is used
+        self.assertTrue((abs(I-self.I3)<1E-6).all())
+        os.remove('img_lam100_fs1.npy')
+        #The ASCII file is still read if the .npy file cannot be written
+        writeIMG('img_lam100_fs1.dat',self.I1)
+        with unittest.mock.patch('os.replace',side_effect=PermissionError):
+            I=read_dat('img_lam100_fs1.dat')
+        self.assertTrue((abs(I-self.I1)<1E-6).all())
+        self.assertFalse(os.path.exists('img_lam100_fs1.npy'))
+        self.assertEqual(len([f for f in os.listdir('.') 
+            if f.endswith('.tmp.npy')]),0)
+        siliscopy.plot_image.cache_dat=False
+        try:
+            I=read_dat('img_lam100_fs1.dat')
+        finally:
+            siliscopy.plot_image.cache_dat=True
+        self.assertTrue((abs(I-self.I1)<1E-6).all())
+        self.assertFalse(os.path.exists('img_lam100_fs1.npy'))
+        os.system('rm -f img_lam100_fs1*')
+
+    @unittest.skipIf(importlib.util.find_spec('pandas') is None,
+        'pandas is not installed')
+    def test_read_ascii_pandas(self): #pandas and np.loadtxt parse alike
+        I=np.round(np.random.random((7,5)),6)
+        I[0,:]=-1
+        writeIMG('img_lam100_fs1.dat',I)
+        I1=siliscopy.plot_image._read_ascii('img_lam100_fs1.dat')
+        I2=np.loadtxt('img_lam100_fs1.dat', comments='#', ndmin=2, 
+            dtype=np.float32)
+        self.assertEqual(I1.dtype,I2.dtype)
+        self.assertTrue((I1==I2).all())
+        os.remove('img_lam100_fs1.dat')
+
+    def test_cache_dat_spawn(self): #Spawned workers re-import the module
+        pi=siliscopy.plot_image
+        writeIMG('img0_lam100_fs1.dat',self.I2)
+        writeIMG('img1_lam100_fs1.dat',self.I3)
+        spawn=multiprocessing.get_context('spawn')
+        mp_ctx=pi.mp_ctx
+        pi.cache_dat=False
+        pi.mp_ctx=spawn
+        try:
+            pi.plot_grey_2dtimg('img',[1],[100],1,0,2,1,1,[6,6],[1,1,1],5,
+                outfile='out',mprocess=True)
+            with spawn.Pool(1) as pool: #Not made by worker_pool
+                IMG=pi.get_grey_img('img',1,100,2,0,1,[6,6],pool=pool)
+            IMG0=pi.get_grey_img('img',1,100,2,0,1,[6,6])
+        finally:
+            pi.cache_dat=True
+            pi.mp_ctx=mp_ctx
+        self.assertEqual(tifffile.imread('out0-2_lam100_fs1_T1_I1.tiff'
+            ).shape,(2,6,6))
+        self.assertTrue((abs(IMG-IMG0)<1E-6).all())
+        self.assertFalse(os.path.exists('img0_lam100_fs1.npy'))
+        self.assertFalse(os.path.exists('img1_lam100_fs1.npy'))
+        os.system('rm -f img*_lam100_fs1.dat out*.tiff')
+
     def test_add_color(self):
         IMGs=np.zeros((3,2,5))
         #Check hue-value addition
@@ -792,6 +870,153 @@ class TestPlotImage(unittest.TestCase):
         self.assertTrue((abs(newIMGs[2,0,:]-np.array([0.9,0.7969928058,0.6]))<1E-6).all())
         #5-color
         self.assertTrue((abs(newIMGs[2,1,:]-np.array([0.5,0.9,0.8375138173]))<1E-6).all())
+        #rgb mixing keeps float32 images in float32
+        newIMGs=siliscopy.plot_image.add_color(IMGs.astype(np.float32),hues,
+            mix_type='rgb')
+        self.assertEqual(newIMGs.dtype,np.float32)
+        self.assertTrue((abs(newIMGs[0,0,:]-np.array([1,1,0]))<1E-6).all())
+
+    def test_hsv2rgb_vec(self):
+        h=np.array([0,1/6.,0.25,0.5,0.7,5/6.,0.95,1])
+        s=np.linspace(0,1,8)
+        v=np.linspace(1,0.3,8)
+        rgb=siliscopy.plot_image.hsv2rgb_vec(h,s,v)
+        for i in range(len(h)):
+            rgb0=siliscopy.plot_image.hsv2rgb(h[i],s[i],v[i])
+            self.assertTrue((abs(rgb[i,:]-np.array(rgb0))<1E-6).all())
+
+    def test_rgb2hsv_vec(self):
+        rgb=np.array([[0,0,0],[1,1,1],[1,0.5,0],[0.2,0.9,0.4],[0.1,0.3,0.8],
+                      [0.6,0.2,0.7]])
+        hsv=siliscopy.plot_image.rgb2hsv_vec(rgb)
+        for i in range(len(rgb)):
+            hsv0=siliscopy.plot_image.rgb2hsv(rgb[i,0],rgb[i,1],rgb[i,2])
+            self.assertTrue((abs(hsv[i,:]-np.array(hsv0))<1E-6).all())
+
+    def test_intensity2image(self):
+        I=np.array([[-1,0,0.5],[0.25,1,1.5]])
+        img=siliscopy.plot_image.intensity2image(I,np.uint8)
+        self.assertTrue((img==np.array([[0,0,127],[63,255,255]])).all())
+        self.assertEqual(img.dtype,np.uint8)
+        out=np.zeros((3,2),dtype=np.uint16)
+        siliscopy.plot_image.intensity2image(I,np.uint16,out=out.T)
+        self.assertTrue((out.T==(np.clip(I,0,1)*65535).astype(np.uint16)).all())
+        img2=siliscopy.plot_image.intensity2image(I.copy(),np.uint8,
+            overwrite=True)
+        self.assertTrue((img2==img).all())
+
+    def test_imap_bounded(self):
+        args=iter(range(20))
+        with siliscopy.plot_image.mp_ctx.Pool(2) as pool:
+            res=siliscopy.plot_image._imap_bounded(pool,abs,args,depth=3)
+            self.assertEqual(next(res),0)
+            self.assertEqual(len(list(args)),17) #Only depth were submitted
+        args=range(-5,5)
+        with siliscopy.plot_image.mp_ctx.Pool(2) as pool:
+            res=list(siliscopy.plot_image._imap_bounded(pool,abs,args))
+        self.assertEqual(res,[abs(x) for x in args])
+
+    def test_write_tiff(self):
+        img=(np.random.random((3,2,40,30))*255).astype(np.uint8) #ZCYX
+        meta={'spacing': 2.0, 'unit': 'nm', 'axes': 'ZCYX'}
+        siliscopy.plot_image._write_tiff('out.tiff',img,(1.,1.),meta)
+        with tifffile.TiffFile('out.tiff') as f:
+            self.assertTrue(f.is_imagej)
+            self.assertTrue((f.asarray()==img).all())
+        #Large images are tiled BigTIFF files, pages can be streamed.
+        bigtiff_size=siliscopy.plot_image.bigtiff_size
+        siliscopy.plot_image.bigtiff_size=0
+        try:
+            siliscopy.plot_image._write_tiff('out.tiff',
+                iter(img.reshape(-1,40,30)),(1.,1.),meta,shape=img.shape,
+                dtype=img.dtype)
+        finally:
+            siliscopy.plot_image.bigtiff_size=bigtiff_size
+        with tifffile.TiffFile('out.tiff') as f:
+            self.assertTrue(f.is_bigtiff and f.pages[0].is_tiled)
+            self.assertEqual(f.series[0].axes,'ZCYX')
+            self.assertTrue((f.asarray()==img).all())
+        os.system('rm -f out.tiff')
+
+    def test_plot_tiff_stacks(self): #2DT, 3D and 3DT tiff pages
+        pi=siliscopy.plot_image
+        MaxBox=[6,5]
+        rng=np.random.default_rng(1)
+        for ti in range(2):
+            for lam in [100,200]:
+                for n in range(3):
+                    I=rng.random((6,5))
+                    I[0,:]=-1
+                    if n==1 and ti==0:
+                        I[:]=-1 #Empty slice
+                    writeIMG('img'+str(ti)+'_z'+str(n)+'_lam'+str(lam)+
+                        '_fs1.dat',I)
+                writeIMG('img'+str(ti)+'_lam'+str(lam)+'_fs1.dat',
+                    rng.random((6,5)))
+        I0s=[1,0.5]
+        lams=[100,200]
+        hues=[0,120]
+        def grey(lam_I0,lam,ti,n=None): #expected page, YX
+            IMG=pi.get_grey_img('img',lam_I0,lam,1,ti,1,MaxBox,True,
+                None if n is None else 2,n)
+            return pi.intensity2image(IMG,np.uint16).T
+        def col(ti,mix_type,n=None): #expected page, CYX
+            IMG=pi.get_col_img('img',I0s,lams,hues,1,ti,1,MaxBox,mix_type,
+                None if n is None else 2,n)
+            return pi.intensity2image(IMG,np.uint8).transpose(2,1,0)
+        for mprocess in [True,False]:
+            #3DT grey, one file per wavelength. Z is reversed.
+            pi.plot_grey_3dtimg('img',I0s,lams,1,0,2,1,1,MaxBox,[1,1,1],3,
+                2,5,outfile='out',otype='tiff16',mprocess=mprocess)
+            for l in range(2):
+                img=tifffile.imread('out0-2_z_lam'+str(lams[l])+
+                    '_fs1_T1_I'+str(I0s[l])+'.tiff')
+                self.assertEqual(img.shape,(2,3,5,6))
+                for ti in range(2):
+                    for n in range(3):
+                        self.assertTrue((img[ti,2-n]==grey(I0s[l],lams[l],ti,
+                            n)).all())
+            #3D color
+            pi.plot_col_3dimg('img',I0s,lams,hues,1,1,1,MaxBox,[1,1,1],3,2,
+                outfile='out',mprocess=mprocess)
+            img=tifffile.imread('out1_z_fs1_T1_I_1_0.5.tiff')
+            self.assertEqual(img.shape,(3,3,5,6))
+            for n in range(3):
+                self.assertTrue((img[2-n]==col(1,'mt',n)).all())
+            #2DT color, unmixed channels
+            pi.plot_col_2dtimg('img',I0s,lams,hues,1,0,2,1,1,MaxBox,5,
+                [1,1,1],outfile='out',mix_type='none',mprocess=mprocess)
+            img=tifffile.imread('out0-2_fs1_T1_I_1_0.5.tiff')
+            self.assertEqual(img.shape,(2,2,5,6))
+            for ti in range(2):
+                self.assertTrue((img[ti]==col(ti,'none')).all())
+            #3D grey image returned as an array, reusing a buffer
+            img=pi.get_grey_3dimg('img',1,100,1,0,1,MaxBox,[1,1,1],3,2,
+                otype='tiff16',mprocess=mprocess)
+            img2=pi.get_grey_3dimg('img',1,100,1,1,1,MaxBox,[1,1,1],3,2,
+                mprocess=mprocess,out=img)
+            self.assertTrue(img2 is img)
+            for n in range(3):
+                self.assertTrue((img[2-n]==grey(1,100,1,n)).all())
+            os.system('rm -f out*.tiff')
+        os.system('rm -f img*.dat')
+
+    def test_plot_grey_serial(self): #One pool for all timesteps
+        pi=siliscopy.plot_image
+        for ti in range(3):
+            for lam in [100,200]:
+                writeIMG('img'+str(ti)+'_lam'+str(lam)+'_fs1.dat',self.I3)
+        with unittest.mock.patch.object(pi,'_NCPU',2), \
+            unittest.mock.patch.object(pi,'worker_pool',
+            wraps=pi.worker_pool) as worker_pool:
+            pi.plot_grey_serial('img',[1,0.5],[100,200],1,0,3,1,1,[6,6],6,1,
+                4,'out',1.0,False,None,None,'png',0,None)
+        self.assertEqual(worker_pool.call_count,1)
+        for ti in range(3):
+            for I0,lam in [(1,100),(0.5,200)]:
+                self.assertTrue(os.path.exists('out'+str(ti)+'_lam'+str(lam)
+                    +'_fs1_T1_I'+str(I0)+'.png'))
+        os.system('rm -f img*_fs1.dat out*.png')
 
     def test_plot_ism(self): #Checks the shape of images produced.
         #Grey 2d, dynamic
@@ -808,7 +1033,21 @@ class TestPlotImage(unittest.TestCase):
         print(sha0,sha1)
         self.assertTrue(abs(sha0[1]/sha0[0]-sha1[1]/sha1[0])<1E-6) 
         os.system('rm -f *.jpeg')
-    
+
+        #Zoomed by more than 3, pixels are repeated like matplotlib's imshow
+        siliscopy.plot_image.plot_ism(img0,[0.1],[2],1,3,4,filename='out',dpi=8,
+            otype='png')
+        img1=cv2.imread('out3_lam2_fs4_T1_I0.1.png',cv2.IMREAD_GRAYSCALE)
+        img=np.kron((img0*255).astype(np.uint8),np.ones((12,12),dtype=np.uint8))
+        self.assertTrue((img1==img).all())
+        os.system('rm -f *.png')
+
+        #Frame color is applied without changing the input image
+        img2=copy.deepcopy(self.I2)
+        siliscopy.plot_image.plot_ism(img2,[0.1],[2],1,3,4,filename='out',dpi=1)
+        self.assertTrue((img2==self.I2).all())
+        os.system('rm -f *.jpeg')
+
     #    #Grey 2d, static: Expected to be the same. Removed to keep test.py fast.
     #    siliscopy.plot_image.plot_ism(img0,[0.1],[2],1,-1,4,filename='out',dpi=1)
     #    img1=cv2.imread('out_lam2_fs4_I0.1.jpeg')